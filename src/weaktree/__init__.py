@@ -1 +1,2 @@
 from .node import WeakTreeNode  # noqa: F401
+from .arena import WeakTreeArena, WeakTreeNodeRef  # noqa: F401
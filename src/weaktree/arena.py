@@ -0,0 +1,421 @@
+from __future__ import annotations
+
+from array import array
+from functools import partial
+from typing import TYPE_CHECKING
+from weakref import ref
+
+from .node import CleanupMode
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from typing import Any
+
+
+__all__ = ["WeakTreeArena", "WeakTreeNodeRef"]
+
+
+# Sentinel index, used for both "no trunk" and "no free slots".
+_NONE = -1
+# Cleanup mode byte marking a slot that is on the free list.
+_FREE = 0
+
+_DEFAULT = CleanupMode.DEFAULT.value
+_PRUNE = CleanupMode.PRUNE.value
+_REPARENT = CleanupMode.REPARENT.value
+
+
+def _remove(arenaref: ref[WeakTreeArena[Any]], index: int, wr: ref) -> None:
+    # Like WeakTreeNode, only hold on to the arena weakly from within the callback.
+    arena = arenaref()
+    if arena is None:
+        return
+    if callback := arena._callbacks[index]:
+        callback(wr)
+        # The callback may have freed the node, and the id already gone to a new one.
+        if arena._data[index] is not wr:
+            return
+    arena._cleanup(index)
+
+
+class WeakTreeArena[T]:
+    """
+    Stores weakly-referencing trees as a set of parallel arrays instead of as
+    individual node objects, with each node identified by an integer id. Traversal
+    only has to touch those arrays, which makes it considerably cheaper than walking
+    WeakTreeNodes for large trees.
+
+    Nodes clean up after themselves the same way WeakTreeNodes do. The ids of nodes
+    that are removed are recycled for new nodes, so ids should not be held on to
+    after their node has been removed from the arena.
+    """
+
+    __slots__ = (
+        "_data",
+        "_trunks",
+        "_branches",
+        "_cleanup_modes",
+        "_callbacks",
+        "_first_free",
+        # The arena is weakly referenced by the cleanup callbacks.
+        "__weakref__",
+    )
+
+    def __init__(self) -> None:
+        self._data: list[ref[T] | None] = []
+        # For free slots, this holds the id of the next free slot instead.
+        self._trunks = array("i")
+        self._branches: list[list[int]] = []
+        self._cleanup_modes = bytearray()
+        self._callbacks: list[Callable[[ref], None] | None] = []
+
+        self._first_free: int = _NONE
+
+    def allocate(
+        self,
+        data: T,
+        trunk: int | None = None,
+        cleanup_mode: CleanupMode = CleanupMode.DEFAULT,
+        callback: Callable[[ref], None] | None = None,
+    ) -> int:
+        """
+        Creates a new node in the arena, storing a weak reference to the passed value.
+
+        :param data: The data to be stored by the new node.
+        :param trunk: The id of the previous node in the tree for the new node,
+            defaults to None, which indicates a top-level node.
+        :param cleanup_mode: An enum indicating how the tree should cleanup after
+            itself when the data reference expires, defaults to DEFAULT
+        :param callback: An optional additional callback function, called when the
+            data reference expires. Defaults to None.
+        :return: The id of the newly created node.
+        """
+        trunk_index = _NONE if trunk is None else self._validate(trunk)
+
+        # Claim the slot before making the reference, since that can set off a
+        # garbage collection that frees other nodes onto the free list.
+        if (index := self._first_free) != _NONE:
+            self._first_free = self._trunks[index]
+            self._trunks[index] = trunk_index
+            self._cleanup_modes[index] = cleanup_mode.value
+            self._callbacks[index] = callback
+        else:
+            index = len(self._data)
+            self._data.append(None)
+            self._trunks.append(trunk_index)
+            self._branches.append([])
+            self._cleanup_modes.append(cleanup_mode.value)
+            self._callbacks.append(callback)
+
+        try:
+            self._data[index] = ref(data, partial(_remove, ref(self), index))
+        except TypeError:
+            # Data that can't be weakly referenced shouldn't leave a half-made node
+            # behind, so hand the slot straight back.
+            self._callbacks[index] = None
+            self._cleanup_modes[index] = _FREE
+            self._trunks[index] = self._first_free
+            self._first_free = index
+            raise
+
+        if trunk_index != _NONE:
+            self._branches[trunk_index].append(index)
+        return index
+
+    def free(self, index: int) -> None:
+        """
+        Removes a node and all of its descendants from the arena, making their ids
+        available for reuse.
+
+        :param index: The id of the node to remove.
+        """
+        self._validate(index)
+        self._detach(index)
+
+        data = self._data
+        trunks = self._trunks
+        branches = self._branches
+        cleanup_modes = self._cleanup_modes
+        callbacks = self._callbacks
+
+        stack = [index]
+        while stack:
+            index = stack.pop()
+            stack.extend(branches[index])
+            branches[index].clear()
+            # Dropping the reference means its callback won't fire for a recycled id.
+            data[index] = None
+            callbacks[index] = None
+            cleanup_modes[index] = _FREE
+            trunks[index] = self._first_free
+            self._first_free = index
+
+    def data(self, index: int) -> T | None:
+        """
+        The value stored by the node, or None if it has expired.
+        """
+        data = self._data[self._validate(index)]
+        assert data is not None
+        return data()
+
+    def trunk(self, index: int) -> int | None:
+        """
+        The id of the node that sits higher in the tree than the given node.
+        If None, the node is considered top-level.
+        """
+        trunk = self._trunks[self._validate(index)]
+        return None if trunk == _NONE else trunk
+
+    def set_trunk(self, index: int, trunk: int | None) -> None:
+        """
+        Moves a node, along with its descendants, to a new trunk.
+
+        :param index: The id of the node to move.
+        :param trunk: The id of the new trunk node, or None to make the node
+            top-level.
+        """
+        self._validate(index)
+        trunk_index = _NONE if trunk is None else self._validate(trunk)
+        self._detach(index)
+        self._trunks[index] = trunk_index
+        if trunk_index != _NONE:
+            self._branches[trunk_index].append(index)
+
+    def branches(self, index: int) -> list[int]:
+        """
+        The ids of the nodes that descend from the given node, in insertion order.
+        """
+        return self._branches[self._validate(index)].copy()
+
+    def cleanup_mode(self, index: int) -> CleanupMode:
+        """
+        The enum value that determines how the node cleans up when its data expires.
+        """
+        return CleanupMode(self._cleanup_modes[self._validate(index)])
+
+    def set_cleanup_mode(self, index: int, mode: CleanupMode) -> None:
+        self._cleanup_modes[self._validate(index)] = mode.value
+
+    def breadth(self, index: int) -> Iterator[int]:
+        """
+        Provides a generator that performs a breadth-first traversal of the tree
+        starting at the given node.
+
+        :yield: The id of the next node in the tree, breadth-first.
+        """
+        branches = self._branches
+        # Scanned while being extended, the same as TreeIterable.breadth().
+        queue = [self._validate(index)]
+        extend = queue.extend
+        for index in queue:
+            yield index
+
+            extend(branches[index])
+
+    def depth(self, index: int) -> Iterator[int]:
+        """
+        Provides a generator that performs a depth-first traversal of the tree
+        starting at the given node.
+
+        :yield: The id of the next node in the tree, depth-first.
+        """
+        branches = self._branches
+        stack = [self._validate(index)]
+        pop = stack.pop
+        extend = stack.extend
+        while stack:
+            index = pop()
+            yield index
+
+            extend(branches[index])
+
+    def towards_root(self, index: int) -> Iterator[int]:
+        """
+        Provides a generator that traces the tree back to the furthest trunk.
+
+        :yield: The id of the trunk node of the previous node.
+        """
+        trunks = self._trunks
+        index = self._validate(index)
+        while index != _NONE:
+            yield index
+
+            index = trunks[index]
+
+    def node(self, index: int) -> WeakTreeNodeRef[T]:
+        """
+        Returns a handle to the given node, which provides an interface similar to
+        WeakTreeNode.
+        """
+        return WeakTreeNodeRef(self, self._validate(index))
+
+    def _validate(self, index: int) -> int:
+        if not 0 <= index < len(self._data) or self._cleanup_modes[index] == _FREE:
+            raise IndexError(f"{index} is not a node in this arena")
+        return index
+
+    def _detach(self, index: int) -> None:
+        if (trunk := self._trunks[index]) != _NONE:
+            self._branches[trunk].remove(index)
+            self._trunks[index] = _NONE
+
+    def _cleanup(self, index: int) -> None:
+        cleanup_modes = self._cleanup_modes
+        trunks = self._trunks
+
+        # Same rules as WeakTreeNode: DEFAULT defers to the trunk, and a top-level
+        # DEFAULT prunes.
+        node = index
+        mode = cleanup_modes[node]
+        while mode == _DEFAULT:
+            node = trunks[node]
+            if node == _NONE:
+                mode = _PRUNE
+                break
+            mode = cleanup_modes[node]
+
+        if mode == _PRUNE:
+            self.free(index)
+        elif mode == _REPARENT:
+            trunk = trunks[index]
+            branches = self._branches[index]
+            for branch in branches:
+                trunks[branch] = trunk
+            if trunk != _NONE:
+                self._branches[trunk].extend(branches)
+            branches.clear()
+            self.free(index)
+
+
+class WeakTreeNodeRef[T]:
+    """
+    A lightweight handle to a node stored in a WeakTreeArena, providing an interface
+    similar to WeakTreeNode. Handles are only valid while their node remains in the
+    arena.
+    """
+
+    __slots__ = ("_arena", "_index")
+
+    def __init__(self, arena: WeakTreeArena[T], index: int) -> None:
+        self._arena = arena
+        self._index = index
+
+    @property
+    def arena(self) -> WeakTreeArena[T]:
+        return self._arena
+
+    @property
+    def index(self) -> int:
+        """
+        The id of the node within its arena.
+        """
+        return self._index
+
+    @property
+    def branches(self) -> set[WeakTreeNodeRef[T]]:
+        """
+        A set of nodes that descend from the current node.
+        """
+        arena = self._arena
+        return {WeakTreeNodeRef(arena, index) for index in arena.branches(self._index)}
+
+    @property
+    def cleanup_mode(self) -> CleanupMode:
+        return self._arena.cleanup_mode(self._index)
+
+    @cleanup_mode.setter
+    def cleanup_mode(self, mode: CleanupMode) -> None:
+        self._arena.set_cleanup_mode(self._index, mode)
+
+    @property
+    def data(self) -> T | None:
+        """
+        The value stored by the node.
+        """
+        return self._arena.data(self._index)
+
+    @property
+    def trunk(self) -> WeakTreeNodeRef[T] | None:
+        """
+        A node that sits higher in the tree than the current node.
+        If None, the current node is considered top-level.
+        """
+        trunk = self._arena.trunk(self._index)
+        return None if trunk is None else WeakTreeNodeRef(self._arena, trunk)
+
+    @trunk.setter
+    def trunk(self, node: WeakTreeNodeRef[T] | None) -> None:
+        self._arena.set_trunk(self._index, None if node is None else node._index)
+
+    def add_branch(
+        self,
+        data: T,
+        cleanup_mode: CleanupMode = CleanupMode.DEFAULT,
+        callback: Callable[[ref], None] | None = None,
+    ) -> WeakTreeNodeRef[T]:
+        """
+        Creates a new node as a child of the current node, with a weak reference to the
+        passed value.
+
+        :param data: The data to be stored by the new node
+        :param cleanup_mode: An enum indicating how the tree should cleanup after
+            itself when the data reference expires, defaults to DEFAULT
+        :param callback: An optional additional callback function, called when the
+            data reference expires. Defaults to None.
+        :return: The newly created node.
+        """
+        arena = self._arena
+        return WeakTreeNodeRef(
+            arena, arena.allocate(data, self._index, cleanup_mode, callback)
+        )
+
+    def breadth(self) -> Iterator[WeakTreeNodeRef[T]]:
+        """
+        Provides a generator that performs a breadth-first traversal of the tree
+        starting at the current node.
+
+        :yield: The next node in the tree, breadth-first.
+        """
+        arena = self._arena
+        for index in arena.breadth(self._index):
+            yield WeakTreeNodeRef(arena, index)
+
+    def depth(self) -> Iterator[WeakTreeNodeRef[T]]:
+        """
+        Provides a generator that performs a depth-first traversal of the tree
+        starting at the current node.
+
+        :yield: The next node in the tree, depth-first.
+        """
+        arena = self._arena
+        for index in arena.depth(self._index):
+            yield WeakTreeNodeRef(arena, index)
+
+    def towards_root(self) -> Iterator[WeakTreeNodeRef[T]]:
+        """
+        Provides a generator that traces the tree back to the furthest trunk.
+
+        :yield: The trunk node of the previous node.
+        """
+        arena = self._arena
+        for index in arena.towards_root(self._index):
+            yield WeakTreeNodeRef(arena, index)
+
+    def __iter__(self) -> Iterator[WeakTreeNodeRef[T]]:
+        """
+        Default iteration method, in this case, breadth-first.
+
+        :yield: The next node in the tree, breadth-first.
+        """
+        yield from self.breadth()
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, WeakTreeNodeRef):
+            return NotImplemented
+        return self._arena is other._arena and self._index == other._index
+
+    def __hash__(self) -> int:
+        return hash((id(self._arena), self._index))
+
+    def __repr__(self) -> str:
+        return f"WeakTreeNodeRef({self.data}, {self._index})"
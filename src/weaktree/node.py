@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from collections import deque
-from enum import auto, Enum
+from array import array
+from enum import auto, Enum, IntEnum
+from functools import partial
 from typing import TYPE_CHECKING
 from weakref import ref
 
@@ -11,12 +12,43 @@ if TYPE_CHECKING:
     from typing import Any, ClassVar
 
 
-class CleanupMode(Enum):
+__all__ = [
+    "CleanupMode",
+    "WeakTreeNode",
+    "TreeIterable",
+    "NodeIterable",
+    "ValueIterable",
+    "ItemsIterable",
+]
+
+
+# An IntEnum hashes and compares as a plain int, whereas Enum members hash by name in
+# Python code, which was showing up in the cleanup lookup.
+class CleanupMode(IntEnum):
     DEFAULT = auto()
     PRUNE = auto()
     REPARENT = auto()
     NO_CLEANUP = auto()
 
+    # Keep the plain Enum text, rather than IntEnum's bare number.
+    __str__ = Enum.__str__
+    __format__ = Enum.__format__
+
+
+# Shared by every node without branches, which in most trees is the majority of them.
+# Being an empty tuple, it can still be iterated over and extended from like a list.
+_NO_BRANCHES: tuple[()] = ()
+
+
+def _remove_branch(trunk: WeakTreeNode[Any], node: WeakTreeNode[Any]) -> None:
+    # A pruned trunk forgets its branches before they forget it, so the node may
+    # already be gone.
+    if branches := trunk._branches:
+        try:
+            branches.remove(node)
+        except ValueError:
+            pass
+
 
 def _idle(node: WeakTreeNode[Any]) -> None:
     # Intentionally do nothing.
@@ -24,18 +56,42 @@ def _idle(node: WeakTreeNode[Any]) -> None:
 
 
 def _prune(node: WeakTreeNode[Any]) -> None:
-    if node.trunk:
-        node.trunk._branches.pop(node, None)
+    # Internal code dereferences _trunk directly instead of going through the
+    # property, since most of it runs inside of weakref callbacks.
+    trunk = trunk_ref() if (trunk_ref := node._trunk) is not None else None
+    if trunk:
+        _remove_branch(trunk, node)
     # This will allow the branch to unwind and be gc'd unless the user has another
     # reference to any of the nodes somehwere.
-    node._branches.clear()
+    node._branches = _NO_BRANCHES
 
 
 def _reparent(node: WeakTreeNode[Any]) -> None:
-    if node.trunk:
-        node.trunk._branches.pop(node, None)
-    for subnode in node._branches.copy():
-        subnode.trunk = node.trunk
+    trunk = trunk_ref() if (trunk_ref := node._trunk) is not None else None
+    if trunk:
+        _remove_branch(trunk, node)
+    # Swap in a fresh list instead of copying, since we're emptying it anyway. This
+    # also saves the trunk setter from removing each subnode from the old list.
+    branches, node._branches = node._branches, _NO_BRANCHES
+    # Our branches are moving to the same trunk we had. Our own trunk ref may be
+    # tied to us, so hand out the trunk's shared one instead.
+    trunk_ref = trunk._self_ref if trunk else None
+    for subnode in branches:
+        subnode._trunk = trunk_ref
+        _invalidate_cleanup(subnode)
+    if trunk and branches:
+        if trunk._branches:
+            trunk._branches.extend(branches)
+        else:
+            trunk._branches = branches
+
+
+# DEFAULT is deliberately missing, since it depends on the rest of the tree.
+_CLEANUP_METHODS: dict[CleanupMode, Callable[[WeakTreeNode], None]] = {
+    CleanupMode.PRUNE: _prune,
+    CleanupMode.REPARENT: _reparent,
+    CleanupMode.NO_CLEANUP: _idle,
+}
 
 
 def _get_cleanup_method(
@@ -43,20 +99,72 @@ def _get_cleanup_method(
     cleanup_mode: CleanupMode,
 ) -> Callable[[WeakTreeNode], None]:
 
-    match cleanup_mode:
-        case CleanupMode.PRUNE:
-            return _prune
-        case CleanupMode.REPARENT:
-            return _reparent
-        case CleanupMode.NO_CLEANUP:
-            return _idle
-        case _:
-            trunk = node.trunk
-            if not trunk:
-                # If we're top level and ask for default, default to pruning.
-                return _prune
-            # Otherwise, find the trunk's cleanup method.
-            return _get_cleanup_method(trunk, trunk._cleanup_mode)
+    # Resolving DEFAULT means walking up the tree, so hang on to the result. Every
+    # node along the way caches its own result too, so siblings can stop early.
+    # This is a loop rather than recursion, since a RecursionError inside of a
+    # weakref callback would just get swallowed.
+    visited: list[WeakTreeNode[Any]] = []
+    while (method := node._resolved_cleanup) is None:
+        visited.append(node)
+        if (method := _CLEANUP_METHODS.get(cleanup_mode)) is not None:
+            break
+        trunk = trunk_ref() if (trunk_ref := node._trunk) is not None else None
+        if not trunk:
+            # If we're top level and ask for default, default to pruning.
+            method = _prune
+            break
+        # Otherwise, find the trunk's cleanup method.
+        node, cleanup_mode = trunk, trunk._cleanup_mode
+
+    for node in visited:
+        node._resolved_cleanup = method
+        # A DEFAULT node with a trunk got its method from further up the tree, which
+        # stops being right if the trunk goes away, so we need to hear about that.
+        # Only nodes that actually cache an inherited method pay for their own ref.
+        if (
+            node._cleanup_mode is CleanupMode.DEFAULT
+            and (trunk_ref := node._trunk) is not None
+            and (trunk := trunk_ref()) is not None
+            and trunk_ref is trunk._self_ref
+        ):
+            node._trunk = ref(trunk, partial(_trunk_expired, node._self_ref))
+    return method
+
+
+def _trunk_expired(selfref: ref[WeakTreeNode[Any]], wr: ref) -> None:
+    # A DEFAULT node that loses its trunk prunes, so whatever it inherited is stale.
+    if (node := selfref()) is not None:
+        _invalidate_cleanup(node)
+
+
+def _invalidate_cleanup(node: WeakTreeNode[Any]) -> None:
+    # Clears the cached cleanup method of the node, as well as any of its descendants
+    # that inherited it. A node without a cached method can't have passed one down,
+    # so we can stop there.
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node._resolved_cleanup is None:
+            continue
+        node._resolved_cleanup = None
+        stack.extend(
+            branch
+            for branch in node._branches
+            if branch._cleanup_mode is CleanupMode.DEFAULT
+        )
+
+
+def _remove(selfref: ref[WeakTreeNode[Any]], wr: ref) -> None:
+    # selfref gives us access to the node within the callback without keeping it
+    # alive.
+    node = selfref()
+    if node is None:
+        return
+    # It's fine to keep our user callback alive, though, it shouldn't be bound to
+    # anything.
+    if callback := node._callback:
+        callback(wr)
+    _get_cleanup_method(node, node._cleanup_mode)(node)
 
 
 class WeakTreeNode[T]:
@@ -67,6 +175,18 @@ class WeakTreeNode[T]:
     the node's trunk, or leaving the empty node alone.
     """
 
+    __slots__ = (
+        "_callback",
+        "_data",
+        "_trunk",
+        "_branches",
+        "_cleanup_mode",
+        "_resolved_cleanup",
+        "_self_ref",
+        # Nodes are weakly referenced by their branches and their cleanup callbacks.
+        "__weakref__",
+    )
+
     # These are here to allow use without the user needing to import the enum
     DEFAULT: ClassVar[CleanupMode] = CleanupMode.DEFAULT
     """
@@ -107,22 +227,29 @@ class WeakTreeNode[T]:
 
         self._callback = callback
 
+        # A node's weakref is handed out to its data callback and to all of its
+        # branches, so make it once up front.
+        self._self_ref: ref[WeakTreeNode[T]] = ref(self)
+
         self._data: ref[T]
         self.data = data
 
-        self._trunk: ref[WeakTreeNode[T]] | None = None
-        self.trunk = trunk
-
-        self._branches: dict[WeakTreeNode[T], None] = {}
+        # Only given a real list once the node gains a branch.
+        self._branches: list[WeakTreeNode[T]] | tuple[()] = _NO_BRANCHES
 
         self._cleanup_mode: CleanupMode = cleanup_mode
+        self._resolved_cleanup: Callable[[WeakTreeNode], None] | None = None
+
+        self._trunk: ref[WeakTreeNode[T]] | None = None
+        if trunk:
+            self.trunk = trunk
 
     @property
     def branches(self) -> set[WeakTreeNode[T]]:
         """
         A set of nodes that descend from the current node.
         """
-        return set(self._branches.keys())
+        return set(self._branches)
 
     @property
     def cleanup_mode(self) -> CleanupMode:
@@ -131,6 +258,7 @@ class WeakTreeNode[T]:
     @cleanup_mode.setter
     def cleanup_mode(self, mode: CleanupMode) -> None:
         self._cleanup_mode = mode
+        _invalidate_cleanup(self)
 
     @property
     def data(self) -> T | None:
@@ -142,20 +270,9 @@ class WeakTreeNode[T]:
 
     @data.setter
     def data(self, data: T) -> None:
-
-        # Create a cleanup callback for our data reference
-        def _remove(wr: ref, selfref=ref(self), callback=self._callback) -> None:
-            # selfref gives us access to the instance within the callback without
-            # keeping it alive.
-            self = selfref()
-            # It's fine to keep our user callback alive, though, it shouldn't be bound
-            # to anything.
-            if callback:
-                callback(wr)
-            if self:
-                _get_cleanup_method(self, self._cleanup_mode)(self)
-
-        self._data = ref(data, _remove)
+        # Share one module-level cleanup function between all nodes, rather than
+        # building a new closure for every data reference.
+        self._data = ref(data, partial(_remove, self._self_ref))
 
     @property
     def trunk(self) -> WeakTreeNode[T] | None:
@@ -163,19 +280,25 @@ class WeakTreeNode[T]:
         A node that sits higher in the tree than the current node.
         If None, the current node is considered top-level.
         """
-        if self._trunk:
+        if self._trunk is not None:
             return self._trunk()
         return None
 
     @trunk.setter
     def trunk(self, node: WeakTreeNode | None) -> None:
-        if self.trunk:
-            self.trunk._branches.pop(self)
+        old = old_ref() if (old_ref := self._trunk) is not None else None
+        if old:
+            _remove_branch(old, self)
         if node:
-            self._trunk = ref(node)
-            node._branches[self] = None
+            self._trunk = node._self_ref
+            if node._branches:
+                node._branches.append(self)
+            else:
+                node._branches = [self]
         else:
             self._trunk = None
+        # Our new trunk may clean up differently than the old one.
+        _invalidate_cleanup(self)
 
     def add_branch(
         self,
@@ -198,34 +321,110 @@ class WeakTreeNode[T]:
         """
         return WeakTreeNode(data, self, cleanup_mode, callback)
 
-    def breadth(self) -> Iterator[WeakTreeNode[T]]:
+    def breadth(self, skip_dead: bool = False) -> Iterator[WeakTreeNode[T]]:
         """
         Provides a generator that performs a breadth-first traversal of the tree
         starting at the current node.
 
+        :param skip_dead: If True, nodes whose data has expired are left out of the
+            iteration, though their branches are still traversed. Defaults to False.
         :yield: The next node in the tree, breadth-first.
         """
         # The .breadth() isn't strictly needed, but could cause an issue if we decide
         # to change what the default iteration mode is.
-        yield from NodeIterable(self).breadth()
+        # Hand back the iterable's generator directly, rather than wrapping it in
+        # another generator that would have to be resumed for every node.
+        return NodeIterable(self).breadth(skip_dead)
 
-    def depth(self) -> Iterator[WeakTreeNode[T]]:
+    def depth(self, skip_dead: bool = False) -> Iterator[WeakTreeNode[T]]:
         """
         Provides a generator that performs a depth-first traversal of the tree
         starting at the current node.
 
+        :param skip_dead: If True, nodes whose data has expired are left out of the
+            iteration, though their branches are still traversed. Defaults to False.
         :yield: The next node in the tree, depth-first.
         """
-        yield from NodeIterable(self).depth()
+        return NodeIterable(self).depth(skip_dead)
+
+    def breadth_list(self) -> list[WeakTreeNode[T]]:
+        """
+        Performs a breadth-first traversal of the tree starting at the current node,
+        collecting the nodes into a list. Faster than breadth() when the whole tree is
+        needed anyway.
+
+        :return: A list of the nodes in the tree, breadth-first.
+        """
+        nodes: list[WeakTreeNode[T]] = [self]
+        extend = nodes.extend
+        # Iterating over a list while extending it is well defined, so the output list
+        # can double as the queue.
+        for node in nodes:
+            extend(node._branches)
+        return nodes
 
-    def towards_root(self) -> Iterator[WeakTreeNode[T]]:
+    def depth_list(self) -> list[WeakTreeNode[T]]:
+        """
+        Performs a depth-first traversal of the tree starting at the current node,
+        collecting the nodes into a list. Faster than depth() when the whole tree is
+        needed anyway.
+
+        :return: A list of the nodes in the tree, depth-first.
+        """
+        nodes: list[WeakTreeNode[T]] = []
+        append = nodes.append
+        stack: list[WeakTreeNode[T]] = [self]
+        pop = stack.pop
+        extend = stack.extend
+        while stack:
+            node = pop()
+            append(node)
+            extend(node._branches)
+        return nodes
+
+    def flatten(self) -> tuple[array[int], array[int], array[int]]:
+        """
+        Flattens the tree, starting at the current node, into integer arrays suitable
+        for bulk processing. Each node is identified by its position in
+        breadth_list(), so the current node is always 0.
+
+        The arrays support the buffer protocol, so they can be handed to libraries
+        such as NumPy without copying.
+
+        :return: A tuple of the parent, first child, and next sibling arrays, where
+            -1 indicates that there is no such node.
+        """
+        nodes = self.breadth_list()
+        count = len(nodes)
+        parents = array("i", [-1]) * count
+        first_children = array("i", [-1]) * count
+        next_siblings = array("i", [-1]) * count
+
+        # In breadth-first order, a node's branches always receive consecutive ids.
+        next_id = 1
+        for index, node in enumerate(nodes):
+            if not (branch_count := len(node._branches)):
+                continue
+            first_children[index] = next_id
+            last_id = next_id + branch_count - 1
+            for branch_id in range(next_id, last_id):
+                parents[branch_id] = index
+                next_siblings[branch_id] = branch_id + 1
+            parents[last_id] = index
+            next_id = last_id + 1
+
+        return parents, first_children, next_siblings
+
+    def towards_root(self, skip_dead: bool = False) -> Iterator[WeakTreeNode[T]]:
         """
         Provides a generator that traces the tree back to the furthest trunk.
 
+        :param skip_dead: If True, nodes whose data has expired are left out of the
+            iteration. Defaults to False.
         :yield: The trunk node of the previous node.
         """
 
-        yield from NodeIterable(self).towards_root()
+        return NodeIterable(self).towards_root(skip_dead)
 
     def nodes(self) -> NodeIterable:
         """
@@ -239,32 +438,136 @@ class WeakTreeNode[T]:
         Returns an iterable that allows iteration over the values of the tree, starting
         from the calling node.
         """
-        return ValueIterable[T](self)
+        # Calling the subscripted alias would cost far more than the instance itself,
+        # and the type parameter only matters to static type checkers.
+        return ValueIterable(self)
 
     def items(self) -> ItemsIterable[T]:
         """
         Returns an iterable that allows iteration over both the nodes and values of the
         tree, starting from the calling node.
         """
-        return ItemsIterable[T](self)
+        return ItemsIterable(self)
 
     def __iter__(self) -> Iterator[WeakTreeNode[T]]:
         """
         Default iteration method, in this case, breadth-first.
 
+        Iterates over a snapshot of the tree taken when iteration starts. Use
+        breadth() to traverse the tree lazily instead.
+
         :yield: The next node in the tree, breadth-first.
         """
-        yield from self.breadth()
+        # Looping over the whole tree is by far the most common use of this, and
+        # collecting the list up front avoids resuming a generator for every node.
+        return iter(self.breadth_list())
 
     def __repr__(self) -> str:
         return f"WeakTreeNode({self.data}, {self.trunk})"
 
 
+# Source templates for the traversals of TreeIterable subclasses that define an
+# _OUTPUT_EXPR. Each is compiled once per subclass, with the output expression
+# inlined, so the loops don't have to call _get_iter_output for every node. When the
+# expression uses `data`, the node's data is dereferenced once, up front, and that is
+# what skip_dead checks, so a skipped check can't race with the output.
+_TRAVERSAL_SOURCES: dict[str, str] = {
+    "breadth": """
+def breadth(self, skip_dead=False):
+    queue = [self._trunk_node]
+    extend = queue.extend
+    for node in queue:
+        {bind}
+        if not skip_dead or {alive} is not None:
+            yield {output}
+
+        extend(node._branches)
+""",
+    "depth": """
+def depth(self, skip_dead=False):
+    stack = [self._trunk_node]
+    pop = stack.pop
+    extend = stack.extend
+    while stack:
+        node = pop()
+        {bind}
+        if not skip_dead or {alive} is not None:
+            yield {output}
+
+        extend(node._branches)
+""",
+    "towards_root": """
+def towards_root(self, skip_dead=False):
+    node = self._trunk_node
+    while node:
+        {bind}
+        if not skip_dead or {alive} is not None:
+            yield {output}
+
+        node = trunk_ref() if (trunk_ref := node._trunk) is not None else None
+""",
+}
+
+
+def _build_traversal(
+    cls: type[TreeIterable[Any, Any]], name: str, output: str
+) -> Callable[..., Iterator[Any]]:
+    if "data" in compile(output, "<output>", "eval").co_names:
+        bind, alive = "data = node._data()", "data"
+    else:
+        # Nothing to hold on to, so don't dereference unless we're skipping.
+        bind, alive = "", "node._data()"
+    source = _TRAVERSAL_SOURCES[name].format(output=output, bind=bind, alive=alive)
+    namespace: dict[str, Any] = {}
+    exec(source, {}, namespace)
+    method = namespace[name]
+    method.__qualname__ = f"{cls.__qualname__}.{name}"
+    method.__module__ = cls.__module__
+    method.__doc__ = getattr(TreeIterable, name).__doc__
+    # Remember which output the expression stands in for.
+    method._get_iter_output = cls._get_iter_output
+    return method
+
+
+def _compiled_for(method: Callable[..., Any]) -> Callable[..., Any] | None:
+    # The _get_iter_output a generated traversal replaces, or None if it's not
+    # generated.
+    return getattr(method, "_get_iter_output", None)
+
+
 class TreeIterable[IterT, T](ABC):
     """
     Generic base class for iterating over trees.
     """
 
+    __slots__ = ("_trunk_node",)
+
+    _OUTPUT_EXPR: ClassVar[str | None] = None
+    """
+    Optional source expression, in terms of `node` and its dereferenced `data`,
+    equivalent to _get_iter_output.
+    When a subclass provides one, specialized traversal methods are generated for it.
+    """
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        if (output := cls.__dict__.get("_OUTPUT_EXPR")) is None:
+            # Inherited traversals generated from another class's expression would
+            # ignore a different _get_iter_output, whether it's defined here or comes
+            # from a mixin, so fall back to the generic ones.
+            get_iter_output = cls._get_iter_output
+            for name in _TRAVERSAL_SOURCES:
+                if name in cls.__dict__:
+                    continue
+                compiled_for = _compiled_for(getattr(cls, name))
+                if compiled_for is not None and compiled_for is not get_iter_output:
+                    setattr(cls, name, getattr(TreeIterable, name))
+            return
+        for name in _TRAVERSAL_SOURCES:
+            # Leave alone anything the subclass has written by hand.
+            if name not in cls.__dict__:
+                setattr(cls, name, _build_traversal(cls, name, output))
+
     def __init__(self, starting_node: WeakTreeNode[T]) -> None:
         self._trunk_node = starting_node
 
@@ -272,45 +575,69 @@ class TreeIterable[IterT, T](ABC):
     def _get_iter_output(self, node: WeakTreeNode) -> IterT:
         pass
 
-    def breadth(self) -> Iterator[IterT]:
+    def breadth(self, skip_dead: bool = False) -> Iterator[IterT]:
         """
         Provides a generator that performs a breadth-first traversal of the tree
         starting at the trunk node of the iterable.
+
+        :param skip_dead: If True, nodes whose data has expired are left out of the
+            iteration, though their branches are still traversed. Defaults to False.
         """
-        queue: deque[WeakTreeNode] = deque([self._trunk_node])
-        while queue:
-            node = queue.popleft()
-            yield self._get_iter_output(node)
+        # Bind everything used per node to locals up front to keep the loop tight.
+        get_iter_output = self._get_iter_output
+        # Rather than popping from a deque, the queue is a list that gets scanned
+        # while it's extended, which is considerably faster. Visited nodes stay in
+        # the list until the traversal finishes.
+        queue: list[WeakTreeNode] = [self._trunk_node]
+        extend = queue.extend
+        for node in queue:
+            # Holding on to the data keeps it alive until the output is built.
+            data = node._data() if skip_dead else None
+            if not skip_dead or data is not None:
+                yield get_iter_output(node)
 
-            queue.extend(node.branches)
+            extend(node._branches)
 
-    def depth(self) -> Iterator[IterT]:
+    def depth(self, skip_dead: bool = False) -> Iterator[IterT]:
         """
         Provides a generator that performs a depth-first traversal of the tree,
         starting from the trunk node of the iterable.
+
+        :param skip_dead: If True, nodes whose data has expired are left out of the
+            iteration, though their branches are still traversed. Defaults to False.
         """
+        get_iter_output = self._get_iter_output
         stack: list[WeakTreeNode] = [self._trunk_node]
+        pop = stack.pop
+        extend = stack.extend
         while stack:
-            node = stack.pop()
-            yield self._get_iter_output(node)
+            node = pop()
+            data = node._data() if skip_dead else None
+            if not skip_dead or data is not None:
+                yield get_iter_output(node)
 
-            stack.extend(node.branches)
+            extend(node._branches)
 
-    def towards_root(self) -> Iterator[IterT]:
+    def towards_root(self, skip_dead: bool = False) -> Iterator[IterT]:
         """
         Provides a generator that traces the tree back to the furthest trunk.
+
+        :param skip_dead: If True, nodes whose data has expired are left out of the
+            iteration. Defaults to False.
         """
         node: WeakTreeNode | None = self._trunk_node
         while node:
-            yield self._get_iter_output(node)
+            data = node._data() if skip_dead else None
+            if not skip_dead or data is not None:
+                yield self._get_iter_output(node)
 
-            node = node.trunk
+            node = trunk_ref() if (trunk_ref := node._trunk) is not None else None
 
     def __iter__(self) -> Iterator[IterT]:
         """
         Provides a default iterator for the node. By default, iterates by breadth-first.
         """
-        yield from self.breadth()
+        return self.breadth()
 
 
 class NodeIterable[T](TreeIterable[WeakTreeNode, T]):
@@ -319,6 +646,10 @@ class NodeIterable[T](TreeIterable[WeakTreeNode, T]):
     iterated over.
     """
 
+    __slots__ = ()
+
+    _OUTPUT_EXPR = "node"
+
     def _get_iter_output(self, node: WeakTreeNode[T]) -> WeakTreeNode[T]:
         return node
 
@@ -329,8 +660,12 @@ class ValueIterable[T](TreeIterable[T | None, T]):
     iterated over.
     """
 
+    __slots__ = ()
+
+    _OUTPUT_EXPR = "data"
+
     def _get_iter_output(self, node: WeakTreeNode[T]) -> T | None:
-        return node.data
+        return node._data()
 
 
 class ItemsIterable[T](TreeIterable[tuple[WeakTreeNode[T], T | None], T]):
@@ -339,5 +674,9 @@ class ItemsIterable[T](TreeIterable[tuple[WeakTreeNode[T], T | None], T]):
     iterated over.
     """
 
+    __slots__ = ()
+
+    _OUTPUT_EXPR = "node, data"
+
     def _get_iter_output(self, node: WeakTreeNode) -> tuple[WeakTreeNode, T | None]:
-        return node, node.data
+        return node, node._data()
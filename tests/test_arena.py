@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import gc
+import unittest
+
+from weaktree.arena import WeakTreeArena, WeakTreeNodeRef
+from weaktree.node import CleanupMode
+
+
+class TestObject:
+    # Nodes only hold their data weakly, so __weakref__ has to stay.
+    __slots__ = ("data", "_repr", "__weakref__")
+
+    def __init__(self, data):
+        self.data = data
+        self._repr = f"TestObject({str(data)})"
+
+    def __repr__(self) -> str:
+        return self._repr
+
+
+class TestArena(unittest.TestCase):
+
+    def setUp(self) -> None:
+        test_data: dict[str, TestObject] = {
+            "root": TestObject("Root"),
+            "1": TestObject("1"),
+            "2": TestObject("2"),
+            "3": TestObject("3"),
+            "4": TestObject("4"),
+            "5": TestObject("5"),
+            "6": TestObject("6"),
+        }
+        self.test_data = test_data
+
+        arena = WeakTreeArena[TestObject]()
+        self.arena = arena
+
+        self.root = arena.allocate(test_data["root"])
+
+        branch1 = arena.allocate(test_data["1"], self.root)
+        arena.allocate(test_data["4"], branch1)
+        arena.allocate(test_data["5"], branch1)
+
+        branch2 = arena.allocate(test_data["2"], self.root)
+        arena.allocate(test_data["6"], branch2)
+
+        arena.allocate(test_data["3"], self.root)
+
+    def values(self, indices) -> list[str]:
+        values = []
+        for index in indices:
+            data = self.arena.data(index)
+            assert data
+            values.append(data.data)
+        return values
+
+    def test_breadth(self):
+        self.assertEqual(
+            self.values(self.arena.breadth(self.root)),
+            ["Root", "1", "2", "3", "4", "5", "6"],
+        )
+
+    def test_depth(self):
+        # Branches are pushed in insertion order, so the last one is visited first.
+        self.assertEqual(
+            self.values(self.arena.depth(self.root)),
+            ["Root", "3", "2", "6", "1", "5", "4"],
+        )
+
+    def test_towards_root(self):
+        branch1 = self.arena.branches(self.root)[0]
+        leaf = self.arena.allocate(self.test_data["6"], branch1)
+        self.assertEqual(self.values(self.arena.towards_root(leaf)), ["6", "1", "Root"])
+
+    def test_invalid_index(self):
+        with self.assertRaises(IndexError):
+            self.arena.data(100)
+
+    def test_unreferenceable_data(self):
+        # A failed allocation shouldn't leave a node behind, or use up an id.
+        with self.assertRaises(TypeError):
+            self.arena.allocate(5, self.root)  # type: ignore
+        self.assertEqual(len(self.arena.branches(self.root)), 3)
+        with self.assertRaises(IndexError):
+            self.arena.data(7)
+        self.assertEqual(self.arena.allocate(self.test_data["1"]), 7)
+
+        # Same for a recycled id.
+        self.arena.free(7)
+        with self.assertRaises(TypeError):
+            self.arena.allocate(5)  # type: ignore
+        with self.assertRaises(IndexError):
+            self.arena.data(7)
+        self.assertEqual(self.arena.allocate(self.test_data["1"]), 7)
+
+    def test_allocate_during_collection(self):
+        # Making a node's reference can set off a garbage collection, which may free
+        # other nodes while the allocation is in progress. Their ids shouldn't get lost
+        # from the free list.
+        class Cyclic(TestObject):
+            __slots__ = ("cycle",)
+
+        self.addCleanup(gc.set_threshold, *gc.get_threshold())
+        self.addCleanup(gc.enable)
+        gc.disable()
+
+        # Only the garbage collector can get rid of this one.
+        cyclic = Cyclic("Cyclic")
+        cyclic.cycle = cyclic
+        cyclic_index = self.arena.allocate(cyclic)
+        del cyclic
+
+        spare_index = self.arena.allocate(self.test_data["1"])
+        self.arena.free(spare_index)
+
+        gc.set_threshold(1)
+        gc.enable()
+        reused = {
+            self.arena.allocate(self.test_data["1"]),
+            self.arena.allocate(self.test_data["2"]),
+        }
+        self.assertEqual(reused, {cyclic_index, spare_index})
+
+    def setup_ephemeral_data(
+        self,
+        cleanup_mode: CleanupMode = CleanupMode.DEFAULT,
+    ) -> tuple[dict[str, TestObject], int, int, int]:
+        ephemeral_data = {
+            "1": TestObject("E1"),
+            "2": TestObject("E2"),
+            "3": TestObject("E3"),
+        }
+
+        branch_e1 = self.arena.allocate(ephemeral_data["1"], self.root, cleanup_mode)
+        branch_e2 = self.arena.allocate(ephemeral_data["2"], branch_e1)
+        branch_e3 = self.arena.allocate(ephemeral_data["3"], branch_e2)
+
+        return ephemeral_data, branch_e1, branch_e2, branch_e3
+
+    def test_prune(self):
+        ephemeral_data, branch_e1, branch_e2, branch_e3 = self.setup_ephemeral_data()
+
+        ephemeral_data.pop("1")
+
+        # The whole branch should be gone, and its ids available again.
+        self.assertNotIn(branch_e1, self.arena.branches(self.root))
+        for index in (branch_e1, branch_e2, branch_e3):
+            with self.assertRaises(IndexError):
+                self.arena.data(index)
+
+        reused = self.arena.allocate(self.test_data["1"])
+        self.assertIn(reused, (branch_e1, branch_e2, branch_e3))
+
+    def test_reparent(self):
+        ephemeral_data, branch_e1, branch_e2, branch_e3 = self.setup_ephemeral_data(
+            CleanupMode.REPARENT
+        )
+
+        ephemeral_data.pop("1")
+
+        # e2 should now be a child of the root.
+        self.assertEqual(self.arena.trunk(branch_e2), self.root)
+        self.assertIn(branch_e2, self.arena.branches(self.root))
+        self.assertEqual(self.arena.trunk(branch_e3), branch_e2)
+
+    def test_no_cleanup(self):
+        ephemeral_data, branch_e1, branch_e2, _ = self.setup_ephemeral_data(
+            CleanupMode.NO_CLEANUP
+        )
+
+        ephemeral_data.pop("1")
+
+        self.assertIsNone(self.arena.data(branch_e1))
+        self.assertEqual(self.arena.trunk(branch_e2), branch_e1)
+
+    def test_callback(self):
+        global callback_ran
+        callback_ran = False
+
+        def callback(wr):
+            global callback_ran
+            callback_ran = True
+
+        ephemeral_data = TestObject("NotLongForThisWorld")
+
+        self.arena.allocate(ephemeral_data, self.root, callback=callback)
+
+        del ephemeral_data
+
+        self.assertTrue(callback_ran)
+
+    def test_callback_reallocates(self):
+        # A callback that frees its own node can have the id handed straight back
+        # out, and the new node shouldn't get cleaned up in its place.
+        replacement = TestObject("Replacement")
+        new_indices = []
+
+        def callback(wr):
+            self.arena.free(index)
+            new_indices.append(self.arena.allocate(replacement, self.root))
+
+        ephemeral_data = TestObject("NotLongForThisWorld")
+        index = self.arena.allocate(ephemeral_data, self.root, callback=callback)
+
+        del ephemeral_data
+
+        self.assertEqual(new_indices, [index])
+        self.assertIs(self.arena.data(index), replacement)
+        self.assertIn(index, self.arena.branches(self.root))
+
+    def test_set_trunk(self):
+        branch1, branch2, _ = self.arena.branches(self.root)
+        self.arena.set_trunk(branch2, branch1)
+
+        self.assertEqual(self.arena.trunk(branch2), branch1)
+        self.assertNotIn(branch2, self.arena.branches(self.root))
+        self.assertIn(branch2, self.arena.branches(branch1))
+
+
+class TestWeakTreeNodeRef(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.test_data = [TestObject("Root"), TestObject("1"), TestObject("2")]
+        self.arena = WeakTreeArena[TestObject]()
+        self.root = self.arena.node(self.arena.allocate(self.test_data[0]))
+        self.root.add_branch(self.test_data[1]).add_branch(self.test_data[2])
+
+    def test_handles(self):
+        nodes = list(self.root.breadth())
+        self.assertEqual([node.data for node in nodes], self.test_data)
+        for node in nodes:
+            self.assertIsInstance(node, WeakTreeNodeRef)
+
+        leaf = nodes[-1]
+        self.assertEqual(list(leaf.towards_root()), nodes[::-1])
+        self.assertEqual(leaf.trunk, nodes[1])
+        self.assertEqual(self.root.branches, {nodes[1]})
+
+
+if __name__ == "__main__":
+    unittest.main()
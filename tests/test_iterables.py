@@ -5,6 +5,7 @@ import unittest
 
 from weaktree.node import (
     WeakTreeNode,
+    TreeIterable,
     NodeIterable,
     ValueIterable,
     ItemsIterable,
@@ -12,12 +13,15 @@ from weaktree.node import (
 
 
 class TestObject:
+    # Nodes only hold their data weakly, so __weakref__ has to stay.
+    __slots__ = ("data", "_repr", "__weakref__")
 
     def __init__(self, data):
         self.data = data
+        self._repr = f"TestObject({str(data)})"
 
     def __repr__(self) -> str:
-        return f"TestObject({str(self.data)})"
+        return self._repr
 
 
 test_data: dict[str, TestObject] = {
@@ -72,6 +76,13 @@ class TestNodeIterable(unittest.TestCase):
 
             queue.append(node)
 
+    def test_breadth_insertion_order(self):
+        # Branches should be visited in the order they were added.
+        self.assertEqual(
+            [node.data for node in self.iterable.breadth()],
+            [test_data[key] for key in ("root", *"123456789")],
+        )
+
     def test_depth_iterator(self):
 
         stack = []
@@ -158,5 +169,106 @@ class TestItemIterable(unittest.TestCase):
             self.assertIsInstance(value, TestObject)
 
 
+class TestSkipDead(unittest.TestCase):
+
+    def test_single_dereference(self):
+        # Skipping needs the data anyway, so it should only be dereferenced once.
+        # Dereferencing twice lets the data expire between the check and the output,
+        # which can't be forced from outside, so we count calls instead. Traversals go
+        # straight to the node's weakref slot, and the data setter always builds a
+        # fresh weakref, so the only place to count them is by swapping out the slot.
+        node = WeakTreeNode(test_data["1"])
+        data_ref = node._data
+        calls = []
+
+        def counting_ref():
+            calls.append(None)
+            return data_ref()
+
+        node._data = counting_ref  # type: ignore
+
+        for iterable in (ValueIterable(node), ItemsIterable(node)):
+            for traversal in (iterable.breadth, iterable.depth, iterable.towards_root):
+                with self.subTest(traversal=traversal):
+                    calls.clear()
+                    self.assertEqual(len(list(traversal(skip_dead=True))), 1)
+                    self.assertEqual(len(calls), 1)
+
+
+class DataNameIterable(TreeIterable[str, TestObject]):
+    # Relies on the generic traversals and _get_iter_output.
+
+    def _get_iter_output(self, node: WeakTreeNode[TestObject]) -> str:
+        assert node.data
+        return node.data.data
+
+
+class GeneratedDataNameIterable(DataNameIterable):
+    # Gets specialized traversals generated from the expression instead.
+    _OUTPUT_EXPR = "data.data"
+
+
+class OverriddenValueIterable(ValueIterable[TestObject]):
+    # Only overrides _get_iter_output, so the traversals generated for
+    # ValueIterable shouldn't be used.
+
+    def _get_iter_output(self, node: WeakTreeNode[TestObject]) -> str:
+        assert node.data
+        return node.data.data
+
+
+class DataNameMixin:
+
+    def _get_iter_output(self, node: WeakTreeNode[TestObject]) -> str:
+        assert node.data
+        return node.data.data
+
+
+class MixedValueIterable(DataNameMixin, ValueIterable[TestObject]):
+    # Gets its _get_iter_output from the mixin instead.
+    pass
+
+
+class TestCustomIterable(unittest.TestCase):
+
+    def test_traversals(self):
+        for iterable_type in (DataNameIterable, GeneratedDataNameIterable):
+            with self.subTest(iterable_type=iterable_type):
+                iterable = iterable_type(root)
+                self.assertEqual(
+                    list(iterable.breadth()),
+                    [node.data.data for node in root.breadth()],
+                )
+                self.assertEqual(
+                    list(iterable.depth()),
+                    [node.data.data for node in root.depth()],
+                )
+                self.assertEqual(
+                    list(iterable_type(branch9).towards_root()),
+                    ["9", "8", "4", "1", "Root"],
+                )
+
+    def test_overridden_output(self):
+        names = [node.data.data for node in root.breadth()]
+        for iterable_type in (OverriddenValueIterable, MixedValueIterable):
+            with self.subTest(iterable_type=iterable_type):
+                iterable = iterable_type(root)
+                self.assertEqual(list(iterable.breadth()), names)
+                self.assertEqual(list(iterable), names)
+                self.assertEqual(
+                    list(iterable.depth()), [node.data.data for node in root.depth()]
+                )
+                self.assertEqual(
+                    list(iterable_type(branch9).towards_root()),
+                    ["9", "8", "4", "1", "Root"],
+                )
+
+    def test_generated(self):
+        self.assertIsNot(GeneratedDataNameIterable.breadth, DataNameIterable.breadth)
+        self.assertEqual(
+            GeneratedDataNameIterable.breadth.__doc__, TreeIterable.breadth.__doc__
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import sys
 import unittest
 from weakref import ref
 
@@ -13,51 +14,64 @@ from weaktree.node import (
 
 
 class TestObject:
+    # Nodes only hold their data weakly, so __weakref__ has to stay.
+    __slots__ = ("data", "_repr", "__weakref__")
 
     def __init__(self, data):
         self.data = data
+        self._repr = f"TestObject({str(data)})"
 
     def __repr__(self) -> str:
-        return f"TestObject({str(self.data)})"
+        return self._repr
 
 
-class TestNode(unittest.TestCase):
+def build_tree() -> tuple[dict[str, TestObject], WeakTreeNode[TestObject]]:
+    test_data: dict[str, TestObject] = {
+        "root": TestObject("Root"),
+        "1": TestObject("1"),
+        "2": TestObject("2"),
+        "3": TestObject("3"),
+        "4": TestObject("4"),
+        "5": TestObject("5"),
+        "6": TestObject("6"),
+        "7": TestObject("7"),
+        "8": TestObject("8"),
+        "9": TestObject("9"),
+    }
 
-    def setUp(self) -> None:
-        test_data: dict[str, TestObject] = {
-            "root": TestObject("Root"),
-            "1": TestObject("1"),
-            "2": TestObject("2"),
-            "3": TestObject("3"),
-            "4": TestObject("4"),
-            "5": TestObject("5"),
-            "6": TestObject("6"),
-            "7": TestObject("7"),
-            "8": TestObject("8"),
-            "9": TestObject("9"),
-        }
-        self.test_data = test_data
+    root = WeakTreeNode(test_data["root"])
+
+    branch1 = root.add_branch(test_data["1"])
+
+    branch4 = branch1.add_branch(test_data["4"])
+    branch8 = branch4.add_branch(test_data["8"])
+    branch8.add_branch(test_data["9"])
+
+    branch1.add_branch(test_data["5"])
+
+    branch2 = root.add_branch(test_data["2"])
+    branch2.add_branch(test_data["6"])
 
-        self.root = WeakTreeNode(test_data["root"])
+    branch3 = root.add_branch(test_data["3"])
+    branch3.add_branch(test_data["7"])
 
-        branch1 = self.root.add_branch(test_data["1"])
+    # Note: These excess vars all descope after setup, so we don't have to worry
+    # about excess references.
+    # We could also do this by chaining add_branch, but that actually becomes
+    # _less_ readable.
 
-        branch4 = branch1.add_branch(test_data["4"])
-        branch8 = branch4.add_branch(test_data["8"])
-        branch8.add_branch(test_data["9"])
+    return test_data, root
 
-        branch1.add_branch(test_data["5"])
 
-        branch2 = self.root.add_branch(test_data["2"])
-        branch2.add_branch(test_data["6"])
+class TestNode(unittest.TestCase):
+    # None of these tests modify the tree, so it only needs to be built once.
 
-        branch3 = self.root.add_branch(test_data["3"])
-        branch3.add_branch(test_data["7"])
+    test_data: dict[str, TestObject]
+    root: WeakTreeNode[TestObject]
 
-        # Note: These excess vars all descope after setup, so we don't have to worry
-        # about excess references.
-        # We could also do this by chaining add_branch, but that actually becomes
-        # _less_ readable.
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.test_data, cls.root = build_tree()
 
     def test_nodes(self):
         self.assertIsInstance(self.root.nodes(), NodeIterable)
@@ -68,6 +82,104 @@ class TestNode(unittest.TestCase):
     def test_items(self):
         self.assertIsInstance(self.root.items(), ItemsIterable)
 
+    def test_breadth_iterator(self):
+        test_data = self.test_data
+        expected_by_level: tuple[frozenset[TestObject], ...] = (
+            frozenset({test_data["root"]}),
+            frozenset({test_data["1"], test_data["2"], test_data["3"]}),
+            frozenset({test_data["4"], test_data["5"], test_data["6"], test_data["7"]}),
+            frozenset({test_data["8"]}),
+            frozenset({test_data["9"]}),
+        )
+
+        # Index one past the last node of each level, in breadth-first order.
+        layer_end = (1, 4, 8, 9, 10)
+
+        values = [node.data for node in self.root.breadth()]
+        self.assertEqual(len(values), layer_end[-1])
+
+        start = 0
+        for level, end in enumerate(layer_end):
+            with self.subTest(level=level):
+                self.assertEqual(frozenset(values[start:end]), expected_by_level[level])
+            start = end
+
+    def test_breadth_iterator_large(self):
+        # A full binary tree with 8 levels, built a level at a time.
+        height = 8
+        root_data = TestObject(0)
+        tree_data = [root_data]
+        depths = {id(root_data): 0}
+
+        root = WeakTreeNode(root_data)
+        frontier = [root]
+        for depth in range(1, height):
+            next_frontier = []
+            for node in frontier:
+                for _ in range(2):
+                    data = TestObject(len(tree_data))
+                    tree_data.append(data)
+                    depths[id(data)] = depth
+                    next_frontier.append(node.add_branch(data))
+            frontier = next_frontier
+
+        node_depths = [depths[id(node.data)] for node in root.breadth()]
+        self.assertEqual(len(node_depths), 2**height - 1)
+        # Breadth-first means we never go back up a level.
+        self.assertEqual(node_depths, sorted(node_depths))
+
+    def test_breadth_list(self):
+        self.assertEqual(self.root.breadth_list(), list(self.root.breadth()))
+
+    def test_depth_list(self):
+        self.assertEqual(self.root.depth_list(), list(self.root.depth()))
+
+    def test_flatten(self):
+        nodes = self.root.breadth_list()
+        parents, first_children, next_siblings = self.root.flatten()
+
+        self.assertEqual(len(parents), len(nodes))
+        for index, node in enumerate(nodes):
+            trunk = node.trunk
+            self.assertEqual(parents[index], -1 if index == 0 else nodes.index(trunk))
+
+            # Walking the child/sibling links should give back the node's branches, in
+            # the order they were added, which is also the order they're reached in.
+            branches = [branch for branch in nodes if branch.trunk is node]
+            children = []
+            child = first_children[index]
+            while child != -1:
+                children.append(nodes[child])
+                child = next_siblings[child]
+            self.assertEqual(children, branches)
+
+    def test_iter(self):
+        self.assertEqual(list(self.root), list(self.root.breadth()))
+
+    def test_cleanup_mode_text(self):
+        self.assertEqual(str(CleanupMode.PRUNE), "CleanupMode.PRUNE")
+        self.assertEqual(f"{CleanupMode.PRUNE}", "CleanupMode.PRUNE")
+
+    def test_slots(self):
+        # Nodes are slotted, so they shouldn't carry an instance dict around.
+        self.assertFalse(hasattr(self.root, "__dict__"))
+        with self.assertRaises(AttributeError):
+            self.root.some_attribute = None  # type: ignore
+
+
+class TestNodeCleanup(unittest.TestCase):
+    # These tests add to and reshape the tree, so each one gets a fresh copy.
+
+    def setUp(self) -> None:
+        self.test_data, self.root = build_tree()
+
+    def test_trunk_reassign(self):
+        # Reassigning the same trunk shouldn't leave duplicate branches behind.
+        branch = self.root.add_branch(self.test_data["1"])
+        branch.trunk = self.root
+        visits = [node for node in self.root.breadth() if node is branch]
+        self.assertEqual(len(visits), 1)
+
     def test_callback(self):
         # Add a custom callback to a node that will get cleaned up.
 
@@ -118,6 +230,21 @@ class TestNode(unittest.TestCase):
         self.assertIsNone(branch_e2_wr())
         self.assertIsNone(branch_e3_wr())
 
+    def test_prune_kept_branch(self):
+
+        ephemeral_data, branch_e2_wr, _ = self.setup_ephemeral_data()
+
+        # Keep e2 alive past the pruning of e1.
+        branch_e2 = branch_e2_wr()
+        assert branch_e2  # for the static type checker
+
+        ephemeral_data.pop("1")
+
+        # e2 should be able to move on from its pruned trunk.
+        branch_e2.trunk = self.root
+        self.assertIs(branch_e2.trunk, self.root)
+        self.assertIn(branch_e2, self.root.branches)
+
     def test_reparent(self):
 
         ephemeral_data, branch_e2_wr, branch_e3_wr = self.setup_ephemeral_data(
@@ -166,6 +293,100 @@ class TestNode(unittest.TestCase):
         # e1 should be empty, or rather the weakref should return None
         self.assertIsNone(branch_e1.data)
 
+    def test_cleanup_mode_change(self):
+
+        ephemeral_data, branch_e2_wr, branch_e3_wr = self.setup_ephemeral_data(
+            WeakTreeNode.REPARENT
+        )
+
+        # Expire e3 first, so e2 has already worked out its cleanup method.
+        ephemeral_data.pop("3")
+        self.assertIsNone(branch_e3_wr())
+
+        branch_e2 = branch_e2_wr()
+        assert branch_e2  # for the static type checker
+        branch_e1 = branch_e2.trunk
+        assert branch_e1
+
+        # Changing the trunk's mode needs to be seen by e2 as well.
+        branch_e1.cleanup_mode = WeakTreeNode.NO_CLEANUP
+
+        ephemeral_data.pop("2")
+
+        self.assertIsNone(branch_e2.data)
+        self.assertIs(branch_e2.trunk, branch_e1)
+        self.assertIn(branch_e2, branch_e1.branches)
+
+    def test_cleanup_after_trunk_expires(self):
+        # Cleanup methods inherited from a trunk shouldn't outlive it. We check both
+        # the node right below the expired root, and one further down.
+        for held, held_branch in (("b", "c"), ("c", "d")):
+            with self.subTest(held=held):
+                data = {key: TestObject(key) for key in ("a", "b", "c", "d", "leaf")}
+                root = WeakTreeNode(data["a"], cleanup_mode=WeakTreeNode.REPARENT)
+                nodes = {"a": root}
+                for trunk, key in (("a", "b"), ("b", "c"), ("c", "d"), ("c", "leaf")):
+                    nodes[key] = nodes[trunk].add_branch(data[key])
+
+                # Cleaning up the leaf makes c and b cache REPARENT from the root.
+                data.pop("leaf")
+
+                # Only keep the held node and its branch, so everything above them
+                # expires.
+                node = nodes.pop(held)
+                branch = nodes.pop(held_branch)
+                del root
+                nodes.clear()
+
+                # Without a REPARENT trunk, the DEFAULT node should prune, which
+                # leaves the branch pointing at it.
+                data.pop(held)
+                self.assertIs(branch.trunk, node)
+
+    def test_deep_default_cleanup(self):
+        # Finding the cleanup method of a DEFAULT node shouldn't hit the recursion
+        # limit, no matter how far it is from a node with a real cleanup mode.
+        depth = sys.getrecursionlimit() * 2
+        deep_data = [TestObject(i) for i in range(depth)]
+
+        node = self.root
+        for data in deep_data:
+            node = node.add_branch(data)
+        leaf_wr = ref(node)
+
+        del node, data
+        deep_data.pop()
+
+        self.assertIsNone(leaf_wr())
+
+    def test_skip_dead(self):
+
+        ephemeral_data, branch_e2_wr, branch_e3_wr = self.setup_ephemeral_data(
+            WeakTreeNode.NO_CLEANUP
+        )
+
+        ephemeral_data.pop("1")
+
+        branch_e3 = branch_e3_wr()
+        assert branch_e3  # for the static type checker
+
+        for values in (
+            self.root.values().breadth(skip_dead=True),
+            self.root.values().depth(skip_dead=True),
+        ):
+            values = list(values)
+            self.assertNotIn(None, values)
+            # The dead node's branches should still be reached.
+            self.assertIn(ephemeral_data["2"], values)
+            self.assertIn(ephemeral_data["3"], values)
+
+        self.assertEqual(
+            [node.data for node in branch_e3.towards_root(skip_dead=True)],
+            [ephemeral_data["3"], ephemeral_data["2"], self.test_data["root"]],
+        )
+        # Without skipping, the empty node shows up.
+        self.assertIn(None, self.root.values())
+
     def test_data_setter(self):
 
         _, branch_e2_wr, branch_e3_wr = self.setup_ephemeral_data()